@@ -4,7 +4,7 @@ Type stubs for db_connector
 These type hints enable IDE autocompletion and type checking.
 """
 
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from enum import IntEnum
 
 class SslMode(IntEnum):
@@ -144,6 +144,14 @@ class AsyncPool:
         """High-performance bulk insert with prepared statement reuse."""
         ...
     
+    def copy_in(
+        self, 
+        sql: str, 
+        rows: Iterable[Union[str, bytes]]
+    ) -> int:
+        """Bulk load with COPY ... FROM STDIN and return rows copied."""
+        ...
+    
     def execute_raw(self, sql: str) -> None:
         """Execute raw SQL batch (multiple statements separated by semicolons)."""
         ...
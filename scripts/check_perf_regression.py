@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Compare benchmark.py --json output against a baseline
+
+Usage:
+    python benchmark.py --json > current.json
+    python scripts/check_perf_regression.py baseline.json current.json [--threshold 0.05] [--allow-missing]
+
+Exits with status 1 if any benchmark's median per-call time grew by more
+than the threshold (default 5%), or if a baseline benchmark is missing from
+the current results (unless --allow-missing is given). Benchmarks that only
+exist in the current results are reported as new.
+"""
+
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> dict:
+    """Load a --json results file keyed by benchmark name."""
+    with open(path) as f:
+        return {result["name"]: result for result in json.load(f)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.05,
+                        help="allowed relative slowdown of median_ns (default: 0.05)")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="don't fail when a baseline benchmark is missing from the current results")
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+
+    regressions = 0
+    for name, result in current.items():
+        if name not in baseline:
+            print(f"   NEW         {name}")
+            continue
+
+        old = baseline[name]["median_ns"]
+        new = result["median_ns"]
+        change = (new - old) / old
+        if change > args.threshold:
+            status = "REGRESSION"
+            regressions += 1
+        else:
+            status = "ok"
+        print(f"   {status:<11} {name}: {old:.0f} ns -> {new:.0f} ns ({change:+.1%})")
+
+    missing = sorted(baseline.keys() - current.keys())
+    for name in missing:
+        print(f"   MISSING     {name}")
+
+    failed = False
+    if regressions:
+        print(f"\n❌ {regressions} benchmark(s) regressed by more than {args.threshold:.0%}")
+        failed = True
+    if missing and not args.allow_missing:
+        print(f"\n❌ {len(missing)} baseline benchmark(s) missing from current results")
+        failed = True
+    if failed:
+        return 1
+
+    print("\n✅ No performance regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,19 +8,28 @@ use pyo3::exceptions::{PyRuntimeError, PyValueError, PyTimeoutError, PyConnectio
 use std::collections::HashMap;
 use std::sync::Arc;
 use std::time::Duration;
+use bytes::{Bytes, BytesMut};
+use futures_util::SinkExt;
+use futures_util::future::try_join_all;
+use pyo3::types::{PyBytes, PyString};
 use tokio::sync::Mutex;
 use tokio::time::timeout;
-use tokio_postgres::Client;
-use deadpool_postgres::{Config, Pool, Runtime, ManagerConfig, RecyclingMethod, SslMode as DeadpoolSslMode};
+use tokio_postgres::{Client, Statement};
+use deadpool_postgres::{Config, Pool, PoolConfig, Runtime, ManagerConfig, RecyclingMethod, SslMode as DeadpoolSslMode};
 use native_tls::TlsConnector;
 use postgres_native_tls::MakeTlsConnector;
 
 mod error;
+mod statements;
 mod types;
 
 use error::DbError;
+use statements::{ConnectionStatementCache, PooledStatementCache, STATEMENT_CACHE_CAPACITY, is_stale_plan, with_cached_statement};
 use types::{PyValue, row_to_dict};
 
+/// copy_in flushes buffered rows to the server once they reach this many bytes
+const COPY_CHUNK_SIZE: usize = 64 * 1024;
+
 /// SSL Mode for database connections
 #[pyclass(eq, eq_int)]
 #[derive(Clone, Copy, PartialEq, Debug)]
@@ -200,11 +209,15 @@ fn create_tls_connector(accept_invalid_certs: bool) -> Result<MakeTlsConnector,
 }
 
 /// PostgreSQL connection pool with production features
+///
+/// Methods release the GIL while waiting on the database, so calls from
+/// multiple Python threads run concurrently on the shared tokio runtime.
 #[pyclass]
 pub struct AsyncPool {
     pool: Pool,
     runtime: Arc<tokio::runtime::Runtime>,
     statement_timeout: Duration,
+    statements: PooledStatementCache,
 }
 
 #[pymethods]
@@ -224,6 +237,7 @@ impl AsyncPool {
         cfg.manager = Some(ManagerConfig {
             recycling_method: RecyclingMethod::Fast,
         });
+        cfg.pool = Some(PoolConfig::new(config.pool_size));
 
         // Set SSL mode
         cfg.ssl_mode = Some(match config.ssl_mode {
@@ -249,6 +263,7 @@ impl AsyncPool {
             pool,
             runtime: Arc::new(runtime),
             statement_timeout: Duration::from_secs(config.statement_timeout_secs),
+            statements: PooledStatementCache::new(),
         })
     }
 
@@ -259,18 +274,22 @@ impl AsyncPool {
         let params = params.unwrap_or_default();
         let stmt_timeout = self.statement_timeout;
         
-        let rows = self.runtime.block_on(async {
+        let rows = py.allow_threads(|| self.runtime.block_on(async {
             let client = self.pool.get().await.map_err(DbError::Pool)?;
             
             let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> = 
                 params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
             
-            let result = timeout(stmt_timeout, client.query(&sql[..], &params_refs)).await
+            let result = timeout(stmt_timeout, async {
+                with_cached_statement!(self.statements, &client, &sql, |statement| {
+                    client.query(&statement, &params_refs).await
+                })
+            }).await
                 .map_err(|_| DbError::Timeout(format!("Query timed out after {:?}", stmt_timeout)))?
                 .map_err(DbError::Query)?;
             
             Ok::<_, DbError>(result)
-        }).map_err(|e: DbError| match e {
+        })).map_err(|e: DbError| match e {
             DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
             DbError::Pool(e) => PyConnectionError::new_err(format!("Pool error: {}", e)),
             _ => PyRuntimeError::new_err(e.to_string()),
@@ -287,23 +306,27 @@ impl AsyncPool {
 
     /// Execute a query without returning results (INSERT, UPDATE, DELETE)
     #[pyo3(signature = (sql, params=None))]
-    fn execute(&self, sql: &str, params: Option<Vec<PyValue>>) -> PyResult<u64> {
+    fn execute(&self, py: Python<'_>, sql: &str, params: Option<Vec<PyValue>>) -> PyResult<u64> {
         let sql = sql.to_string();
         let params = params.unwrap_or_default();
         let stmt_timeout = self.statement_timeout;
         
-        let count = self.runtime.block_on(async {
+        let count = py.allow_threads(|| self.runtime.block_on(async {
             let client = self.pool.get().await.map_err(DbError::Pool)?;
             
             let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> = 
                 params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
             
-            let result = timeout(stmt_timeout, client.execute(&sql[..], &params_refs)).await
+            let result = timeout(stmt_timeout, async {
+                with_cached_statement!(self.statements, &client, &sql, |statement| {
+                    client.execute(&statement, &params_refs).await
+                })
+            }).await
                 .map_err(|_| DbError::Timeout(format!("Execute timed out after {:?}", stmt_timeout)))?
                 .map_err(DbError::Query)?;
             
             Ok::<_, DbError>(result)
-        }).map_err(|e: DbError| match e {
+        })).map_err(|e: DbError| match e {
             DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
             DbError::Pool(e) => PyConnectionError::new_err(format!("Pool error: {}", e)),
             _ => PyRuntimeError::new_err(e.to_string()),
@@ -313,29 +336,26 @@ impl AsyncPool {
     }
 
     /// Execute many statements in a transaction
-    fn execute_many(&self, statements: Vec<(String, Option<Vec<PyValue>>)>) -> PyResult<Vec<u64>> {
-        let stmt_timeout = self.statement_timeout;
+    /// Statements are pipelined: all are parsed and sent before waiting on any
+    /// result, and statement_timeout bounds the whole batch. If a statement
+    /// can't be parsed before the earlier ones have run (e.g. it uses a table
+    /// created earlier in the batch), they are run one at a time instead.
+    fn execute_many(&self, py: Python<'_>, statements: Vec<(String, Option<Vec<PyValue>>)>) -> PyResult<Vec<u64>> {
+        let statements: Vec<(String, Vec<PyValue>)> = statements.into_iter()
+            .map(|(sql, params)| (sql, params.unwrap_or_default()))
+            .collect();
         
-        let results = self.runtime.block_on(async {
+        let results = py.allow_threads(|| self.runtime.block_on(async {
             let mut client = self.pool.get().await.map_err(DbError::Pool)?;
-            let transaction = client.transaction().await.map_err(DbError::Query)?;
-            
-            let mut counts = Vec::new();
-            for (sql, params) in statements {
-                let params = params.unwrap_or_default();
-                let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> = 
-                    params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
-                
-                let count = timeout(stmt_timeout, transaction.execute(&sql[..], &params_refs)).await
-                    .map_err(|_| DbError::Timeout(format!("Transaction statement timed out after {:?}", stmt_timeout)))?
-                    .map_err(DbError::Query)?;
-                counts.push(count);
+            match self.execute_many_once(&mut client, &statements).await {
+                // Nothing was committed, so the whole transaction can be replayed
+                // on the same connection, whose stale statements were just dropped
+                Err(DbError::Query(e)) if is_stale_plan(&e) => self.execute_many_once(&mut client, &statements).await,
+                result => result,
             }
-            
-            transaction.commit().await.map_err(DbError::Query)?;
-            Ok::<_, DbError>(counts)
-        }).map_err(|e: DbError| match e {
+        })).map_err(|e: DbError| match e {
             DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
+            DbError::Pool(e) => PyConnectionError::new_err(format!("Pool error: {}", e)),
             _ => PyRuntimeError::new_err(e.to_string()),
         })?;
 
@@ -345,15 +365,15 @@ impl AsyncPool {
     /// High-performance bulk insert using a single prepared statement
     /// Much faster than execute_many for inserting many rows with the same SQL
     #[pyo3(signature = (sql, params_list))]
-    fn execute_batch(&self, sql: &str, params_list: Vec<Vec<PyValue>>) -> PyResult<u64> {
+    fn execute_batch(&self, py: Python<'_>, sql: &str, params_list: Vec<Vec<PyValue>>) -> PyResult<u64> {
         let sql = sql.to_string();
         let stmt_timeout = self.statement_timeout;
         
-        let total = self.runtime.block_on(async {
+        let total = py.allow_threads(|| self.runtime.block_on(async {
             let client = self.pool.get().await.map_err(DbError::Pool)?;
             
             // Prepare statement once, reuse for all rows
-            let statement = timeout(stmt_timeout, client.prepare(&sql)).await
+            let statement = timeout(stmt_timeout, self.statements.prepare(&client, &sql)).await
                 .map_err(|_| DbError::Timeout("Statement preparation timed out".to_string()))?
                 .map_err(DbError::Query)?;
             
@@ -364,12 +384,18 @@ impl AsyncPool {
                 
                 let count = timeout(stmt_timeout, client.execute(&statement, &params_refs)).await
                     .map_err(|_| DbError::Timeout("Batch execute timed out".to_string()))?
-                    .map_err(DbError::Query)?;
+                    .map_err(|e| {
+                        // Rows may already be written, so don't retry; re-prepare next call
+                        if is_stale_plan(&e) {
+                            self.statements.invalidate(&client, &sql);
+                        }
+                        DbError::Query(e)
+                    })?;
                 total_count += count;
             }
             
             Ok::<_, DbError>(total_count)
-        }).map_err(|e: DbError| match e {
+        })).map_err(|e: DbError| match e {
             DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
             DbError::Pool(e) => PyConnectionError::new_err(format!("Pool error: {}", e)),
             _ => PyRuntimeError::new_err(e.to_string()),
@@ -378,13 +404,66 @@ impl AsyncPool {
         Ok(total)
     }
 
+    /// Bulk load data with COPY ... FROM STDIN
+    /// `rows` is an iterable of str/bytes chunks in COPY text format, e.g. "name\tvalue\n"
+    fn copy_in(&self, py: Python<'_>, sql: &str, rows: &Bound<'_, PyAny>) -> PyResult<u64> {
+        let stmt_timeout = self.statement_timeout;
+        let timed_out = || DbError::Timeout(format!("COPY timed out after {:?}", stmt_timeout));
+        let to_py_err = |e: DbError| match e {
+            DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
+            DbError::Pool(e) => PyConnectionError::new_err(format!("Pool error: {}", e)),
+            _ => PyRuntimeError::new_err(e.to_string()),
+        };
+
+        // Hold the connection until the COPY finishes so it isn't handed to
+        // another caller mid-copy
+        let (_client, mut sink) = py.allow_threads(|| self.runtime.block_on(async {
+            let client = self.pool.get().await.map_err(DbError::Pool)?;
+            let sink = timeout(stmt_timeout, client.copy_in::<_, Bytes>(sql)).await
+                .map_err(|_| timed_out())?
+                .map_err(DbError::Query)?;
+            Ok::<_, DbError>((client, Box::pin(sink)))
+        })).map_err(to_py_err)?;
+
+        // Send rows in chunks of about COPY_CHUNK_SIZE bytes as they are read,
+        // so memory stays bounded however many rows the iterable yields.
+        // Returning early drops the sink, which aborts the COPY.
+        let mut data = BytesMut::with_capacity(COPY_CHUNK_SIZE);
+        let mut send = |chunk: Bytes| py.allow_threads(|| self.runtime.block_on(async {
+            timeout(stmt_timeout, sink.send(chunk)).await
+                .map_err(|_| timed_out())?
+                .map_err(DbError::Query)
+        })).map_err(to_py_err);
+
+        for row in rows.iter()? {
+            let row = row?;
+            if let Ok(b) = row.downcast::<PyBytes>() {
+                data.extend_from_slice(b.as_bytes());
+            } else {
+                data.extend_from_slice(row.downcast::<PyString>()?.to_cow()?.as_bytes());
+            }
+            if data.len() >= COPY_CHUNK_SIZE {
+                send(data.split().freeze())?;
+            }
+        }
+        if !data.is_empty() {
+            send(data.freeze())?;
+        }
+
+        py.allow_threads(|| self.runtime.block_on(async {
+            timeout(stmt_timeout, sink.as_mut().finish()).await
+                .map_err(|_| timed_out())?
+                .map_err(DbError::Query)
+        })).map_err(to_py_err)
+    }
+
     /// Execute raw SQL batch (multiple statements separated by semicolons)
     /// Use for schema migrations or bulk DDL operations
-    fn execute_raw(&self, sql: &str) -> PyResult<()> {
+    fn execute_raw(&self, py: Python<'_>, sql: &str) -> PyResult<()> {
         let sql = sql.to_string();
         let stmt_timeout = self.statement_timeout;
         
-        self.runtime.block_on(async {
+        py.allow_threads(|| self.runtime.block_on(async {
             let client = self.pool.get().await.map_err(DbError::Pool)?;
             
             timeout(stmt_timeout, client.batch_execute(&sql)).await
@@ -392,7 +471,7 @@ impl AsyncPool {
                 .map_err(DbError::Query)?;
             
             Ok::<_, DbError>(())
-        }).map_err(|e: DbError| match e {
+        })).map_err(|e: DbError| match e {
             DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
             _ => PyRuntimeError::new_err(e.to_string()),
         })?;
@@ -407,18 +486,22 @@ impl AsyncPool {
         let params = params.unwrap_or_default();
         let stmt_timeout = self.statement_timeout;
         
-        let row = self.runtime.block_on(async {
+        let row = py.allow_threads(|| self.runtime.block_on(async {
             let client = self.pool.get().await.map_err(DbError::Pool)?;
             
             let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> = 
                 params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
             
-            let result = timeout(stmt_timeout, client.query_opt(&sql[..], &params_refs)).await
+            let result = timeout(stmt_timeout, async {
+                with_cached_statement!(self.statements, &client, &sql, |statement| {
+                    client.query_opt(&statement, &params_refs).await
+                })
+            }).await
                 .map_err(|_| DbError::Timeout(format!("Query timed out after {:?}", stmt_timeout)))?
                 .map_err(DbError::Query)?;
             
             Ok::<_, DbError>(result)
-        }).map_err(|e: DbError| match e {
+        })).map_err(|e: DbError| match e {
             DbError::Timeout(msg) => PyTimeoutError::new_err(msg),
             _ => PyRuntimeError::new_err(e.to_string()),
         })?;
@@ -430,8 +513,8 @@ impl AsyncPool {
     }
 
     /// Check if connection is healthy
-    fn is_healthy(&self) -> bool {
-        self.runtime.block_on(async {
+    fn is_healthy(&self, py: Python<'_>) -> bool {
+        py.allow_threads(|| self.runtime.block_on(async {
             match timeout(Duration::from_secs(5), self.pool.get()).await {
                 Ok(Ok(client)) => {
                     timeout(Duration::from_secs(5), client.query("SELECT 1", &[]))
@@ -441,7 +524,7 @@ impl AsyncPool {
                 }
                 _ => false,
             }
-        })
+        }))
     }
 
     /// Get pool statistics
@@ -474,12 +557,109 @@ impl AsyncPool {
     }
 }
 
+impl AsyncPool {
+    /// One attempt at execute_many: prepare each distinct SQL once, then run
+    /// every statement inside a single pipelined transaction. Falls back to
+    /// execute_sequential when a statement can't be prepared up front.
+    async fn execute_many_once(
+        &self,
+        client: &mut deadpool_postgres::Client,
+        statements: &[(String, Vec<PyValue>)],
+    ) -> Result<Vec<u64>, DbError> {
+        let stmt_timeout = self.statement_timeout;
+        
+        let mut distinct: Vec<&str> = statements.iter().map(|(sql, _)| sql.as_str()).collect();
+        distinct.sort_unstable();
+        distinct.dedup();
+        
+        // Past the cache capacity the batch would evict its own statements,
+        // so prepare them without the cache
+        let cached = distinct.len() <= STATEMENT_CACHE_CAPACITY;
+        let conn = &*client;
+        let prepared = timeout(stmt_timeout, try_join_all(distinct.iter().map(|sql| async move {
+            if cached {
+                self.statements.prepare(conn, sql).await
+            } else {
+                conn.prepare(sql).await
+            }
+        }))).await
+            .map_err(|_| DbError::Timeout("Statement preparation timed out".to_string()))?;
+        let prepared = match prepared {
+            Ok(prepared) => prepared,
+            // A statement may depend on one earlier in the batch that hasn't run yet
+            Err(_) => return self.execute_sequential(client, statements).await,
+        };
+        let prepared: HashMap<&str, Statement> = distinct.iter().copied().zip(prepared).collect();
+        
+        let params_refs: Vec<Vec<&(dyn tokio_postgres::types::ToSql + Sync)>> = statements.iter()
+            .map(|(_, params)| params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect())
+            .collect();
+        
+        let pipeline = async {
+            let transaction = client.transaction().await.map_err(DbError::Query)?;
+            
+            // tokio-postgres pipelines requests that are polled concurrently on one
+            // connection, so this costs one round trip instead of one per statement
+            let tx = &transaction;
+            let pending = statements.iter().zip(params_refs.iter()).map(|((sql, _), params)| {
+                let statement = &prepared[sql.as_str()];
+                async move { tx.execute(statement, params).await.map_err(DbError::Query) }
+            });
+            let counts = try_join_all(pending).await?;
+            
+            transaction.commit().await.map_err(DbError::Query)?;
+            Ok::<_, DbError>(counts)
+        };
+        // All statements are in flight at once, so they share one timeout
+        let result = match timeout(stmt_timeout, pipeline).await {
+            Ok(result) => result,
+            Err(_) => Err(DbError::Timeout(format!("execute_many timed out after {:?}", stmt_timeout))),
+        };
+        
+        if let Err(DbError::Query(e)) = &result {
+            if is_stale_plan(e) {
+                for sql in &distinct {
+                    self.statements.invalidate(client, sql);
+                }
+            }
+        }
+        
+        result
+    }
+
+    /// Run `statements` in a transaction one at a time, so each is parsed
+    /// only after the ones before it have run
+    async fn execute_sequential(
+        &self,
+        client: &mut deadpool_postgres::Client,
+        statements: &[(String, Vec<PyValue>)],
+    ) -> Result<Vec<u64>, DbError> {
+        let stmt_timeout = self.statement_timeout;
+        let transaction = client.transaction().await.map_err(DbError::Query)?;
+        
+        let mut counts = Vec::with_capacity(statements.len());
+        for (sql, params) in statements {
+            let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> =
+                params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
+            
+            let count = timeout(stmt_timeout, transaction.execute(&sql[..], &params_refs)).await
+                .map_err(|_| DbError::Timeout(format!("Transaction statement timed out after {:?}", stmt_timeout)))?
+                .map_err(DbError::Query)?;
+            counts.push(count);
+        }
+        
+        transaction.commit().await.map_err(DbError::Query)?;
+        Ok(counts)
+    }
+}
+
 /// Simple synchronous connection (no pooling)
 #[pyclass]
 pub struct Connection {
     client: Arc<Mutex<Option<Client>>>,
     runtime: Arc<tokio::runtime::Runtime>,
     statement_timeout: Duration,
+    statements: ConnectionStatementCache,
 }
 
 #[pymethods]
@@ -543,6 +723,7 @@ impl Connection {
             client: Arc::new(Mutex::new(Some(client))),
             runtime: Arc::new(runtime),
             statement_timeout: Duration::from_secs(config.statement_timeout_secs),
+            statements: ConnectionStatementCache::new(),
         })
     }
 
@@ -561,7 +742,11 @@ impl Connection {
             let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> = 
                 params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
             
-            let result = timeout(stmt_timeout, client.query(&sql[..], &params_refs)).await
+            let result = timeout(stmt_timeout, async {
+                with_cached_statement!(self.statements, client, &sql, |statement| {
+                    client.query(&statement, &params_refs).await
+                })
+            }).await
                 .map_err(|_| PyTimeoutError::new_err(format!("Query timed out after {:?}", stmt_timeout)))?
                 .map_err(|e| PyRuntimeError::new_err(format!("Query failed: {}", e)))?;
             
@@ -592,7 +777,11 @@ impl Connection {
             let params_refs: Vec<&(dyn tokio_postgres::types::ToSql + Sync)> = 
                 params.iter().map(|p| p as &(dyn tokio_postgres::types::ToSql + Sync)).collect();
             
-            let result = timeout(stmt_timeout, client.execute(&sql[..], &params_refs)).await
+            let result = timeout(stmt_timeout, async {
+                with_cached_statement!(self.statements, client, &sql, |statement| {
+                    client.execute(&statement, &params_refs).await
+                })
+            }).await
                 .map_err(|_| PyTimeoutError::new_err(format!("Execute timed out after {:?}", stmt_timeout)))?
                 .map_err(|e| PyRuntimeError::new_err(format!("Execute failed: {}", e)))?;
             
@@ -610,6 +799,7 @@ impl Connection {
 
     /// Close the connection
     fn close(&self) -> PyResult<()> {
+        self.statements.clear();
         self.runtime.block_on(async {
             let mut guard = self.client.lock().await;
             *guard = None;
@@ -0,0 +1,143 @@
+//! Prepared statement caching
+//!
+//! Repeated SQL reuses a named server-side statement instead of paying for
+//! Parse on every call. Each connection keeps at most
+//! `STATEMENT_CACHE_CAPACITY` statements and evicts the least recently used.
+
+use std::collections::HashMap;
+use std::num::NonZeroUsize;
+use std::sync::{Arc, Weak};
+use deadpool_postgres::StatementCache;
+use lru::LruCache;
+use parking_lot::Mutex;
+use tokio_postgres::error::SqlState;
+use tokio_postgres::{Client, Error, Statement};
+
+/// Upper bound on cached prepared statements per connection
+pub const STATEMENT_CACHE_CAPACITY: usize = 256;
+
+fn capacity() -> NonZeroUsize {
+    NonZeroUsize::new(STATEMENT_CACHE_CAPACITY).unwrap()
+}
+
+/// Whether a statement failed because its cached plan no longer matches the
+/// schema, e.g. "cached plan must not change result type" after ALTER TABLE
+pub fn is_stale_plan(e: &Error) -> bool {
+    e.code() == Some(&SqlState::FEATURE_NOT_SUPPORTED)
+}
+
+/// Run `$run` with the cached statement for `$sql` bound to `$stmt`.
+/// If the server rejects the cached plan because the schema changed under
+/// it, the statement is dropped from the cache, re-prepared and run once more.
+macro_rules! with_cached_statement {
+    ($cache:expr, $client:expr, $sql:expr, |$stmt:ident| $run:expr) => {{
+        let $stmt = $cache.prepare($client, $sql).await?;
+        match $run {
+            Err(e) if crate::statements::is_stale_plan(&e) => {
+                $cache.invalidate($client, $sql);
+                let $stmt = $cache.prepare($client, $sql).await?;
+                $run
+            }
+            result => result,
+        }
+    }};
+}
+pub(crate) use with_cached_statement;
+
+/// Recency order of the statements cached on one pooled connection
+struct ConnectionOrder {
+    cache: Weak<StatementCache>,
+    order: LruCache<String, ()>,
+}
+
+/// LRU eviction on top of deadpool's per-connection statement cache
+///
+/// deadpool stores the statements but never evicts them, so this tracks
+/// access order per connection and removes the least recently used one
+/// once a connection reaches capacity.
+pub struct PooledStatementCache {
+    // Keyed by the address of the connection's StatementCache. The Weak keeps
+    // that allocation alive, so an address cannot be reused by a new
+    // connection while its entry exists.
+    connections: Mutex<HashMap<usize, ConnectionOrder>>,
+}
+
+impl PooledStatementCache {
+    pub fn new() -> Self {
+        PooledStatementCache {
+            connections: Mutex::new(HashMap::new()),
+        }
+    }
+
+    pub async fn prepare(&self, client: &deadpool_postgres::Client, sql: &str) -> Result<Statement, Error> {
+        let statement = client.prepare_cached(sql).await?;
+        // Track the statement only once deadpool has cached it, so a failed
+        // or still in-flight prepare is never counted or evicted
+        if let Some(evicted) = self.touch(&client.statement_cache, sql) {
+            client.statement_cache.remove(&evicted, &[]);
+        }
+        Ok(statement)
+    }
+
+    /// Forget the cached statement for `sql` on this connection
+    pub fn invalidate(&self, client: &deadpool_postgres::Client, sql: &str) {
+        client.statement_cache.remove(sql, &[]);
+        let key = Arc::as_ptr(&client.statement_cache) as usize;
+        if let Some(conn) = self.connections.lock().get_mut(&key) {
+            conn.order.pop(sql);
+        }
+    }
+
+    /// Mark `sql` as most recently used and return the statement it evicts, if any
+    fn touch(&self, cache: &Arc<StatementCache>, sql: &str) -> Option<String> {
+        let mut connections = self.connections.lock();
+        let key = Arc::as_ptr(cache) as usize;
+
+        if !connections.contains_key(&key) {
+            // New connection: drop the entries of connections that have closed
+            connections.retain(|_, conn| conn.cache.strong_count() > 0);
+            connections.insert(key, ConnectionOrder {
+                cache: Arc::downgrade(cache),
+                order: LruCache::new(capacity()),
+            });
+        }
+
+        let order = &mut connections.get_mut(&key)?.order;
+        if order.get(sql).is_some() {
+            return None;
+        }
+        order.push(sql.to_string(), ()).map(|(evicted, _)| evicted)
+    }
+}
+
+/// Statement cache for a single, unpooled connection
+pub struct ConnectionStatementCache {
+    statements: Mutex<LruCache<String, Statement>>,
+}
+
+impl ConnectionStatementCache {
+    pub fn new() -> Self {
+        ConnectionStatementCache {
+            statements: Mutex::new(LruCache::new(capacity())),
+        }
+    }
+
+    pub async fn prepare(&self, client: &Client, sql: &str) -> Result<Statement, Error> {
+        if let Some(statement) = self.statements.lock().get(sql) {
+            return Ok(statement.clone());
+        }
+        let statement = client.prepare(sql).await?;
+        // An evicted statement is closed on the server when it is dropped
+        self.statements.lock().push(sql.to_string(), statement.clone());
+        Ok(statement)
+    }
+
+    /// Forget the cached statement for `sql`
+    pub fn invalidate(&self, _client: &Client, sql: &str) {
+        self.statements.lock().pop(sql);
+    }
+
+    pub fn clear(&self) {
+        self.statements.lock().clear();
+    }
+}
@@ -24,16 +24,18 @@ DATABASE_URL = os.environ.get(
 )
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def config():
     """Create a test configuration."""
     return ConnectionConfig.from_url(DATABASE_URL)
 
 
-@pytest.fixture
+@pytest.fixture(scope="module")
 def pool(config):
-    """Create a test pool."""
-    return create_pool(config)
+    """Create a test pool shared by the module."""
+    pool = create_pool(config)
+    yield pool
+    pool.close()
 
 
 @pytest.fixture
@@ -92,6 +94,15 @@ class TestConnection:
         assert rows[0]["a"] == 42
         assert rows[0]["b"] == "world"
 
+    def test_statement_cache_schema_change(self, connection):
+        """Test a cached statement is re-prepared after its table changes."""
+        connection.execute("CREATE TEMP TABLE conn_replan (a int)")
+        connection.execute("INSERT INTO conn_replan VALUES (1)")
+        assert connection.query("SELECT * FROM conn_replan") == [{"a": 1}]
+        
+        connection.execute("ALTER TABLE conn_replan ADD COLUMN b int")
+        assert connection.query("SELECT * FROM conn_replan") == [{"a": 1, "b": None}]
+
 
 @pytest.mark.skipif(not LIBRARY_AVAILABLE, reason="Library not built")
 class TestPool:
@@ -125,6 +136,24 @@ class TestPool:
         row = pool.fetch_one("SELECT 1 WHERE false")
         assert row is None
 
+    def test_statement_cache(self, pool):
+        """Test cached statements stay correct past the cache capacity."""
+        for i in range(300):
+            row = pool.fetch_one(f"SELECT $1::int + {i} as num", [1])
+            assert row["num"] == i + 1
+        
+        row = pool.fetch_one("SELECT $1::int + 0 as num", [1])
+        assert row["num"] == 1
+
+    def test_statement_cache_schema_change(self, pool):
+        """Test a cached statement is re-prepared after its table changes."""
+        pool.execute("CREATE TEMP TABLE test_replan (a int)")
+        pool.execute("INSERT INTO test_replan VALUES (1)")
+        assert pool.query("SELECT * FROM test_replan") == [{"a": 1}]
+        
+        pool.execute_raw("ALTER TABLE test_replan ADD COLUMN b int")
+        assert pool.query("SELECT * FROM test_replan") == [{"a": 1, "b": None}]
+
     def test_execute(self, pool):
         """Test execute (no results)."""
         # Create temp table
@@ -142,6 +171,19 @@ class TestPool:
         count = pool.execute("DELETE FROM test_exec WHERE id > 10")
         assert count == 2
 
+    def test_copy_in(self, pool):
+        """Test COPY FROM STDIN bulk load."""
+        pool.execute("CREATE TEMP TABLE test_copy (name text, value int)")
+        
+        count = pool.copy_in(
+            "COPY test_copy (name, value) FROM STDIN",
+            ["a\t1\n", b"b\t2\n"]
+        )
+        assert count == 2
+        
+        rows = pool.query("SELECT * FROM test_copy ORDER BY value")
+        assert [row["name"] for row in rows] == ["a", "b"]
+
 
 @pytest.mark.skipif(not LIBRARY_AVAILABLE, reason="Library not built")
 class TestTypeConversions:
@@ -242,6 +284,45 @@ class TestTransactions:
         assert rows[0]["name"] == "a"
         assert rows[2]["name"] == "c"
 
+    def test_execute_many_failure_rolls_back(self, pool):
+        """Test a failing statement rolls back the whole transaction."""
+        # A regular table, so the count below sees it from any pooled connection
+        pool.execute_raw("""
+            DROP TABLE IF EXISTS tx_fail;
+            CREATE TABLE tx_fail (name text, value int NOT NULL);
+        """)
+
+        try:
+            # The statements are pipelined, so the third one fails too with
+            # "current transaction is aborted"; the error must be the second one's
+            with pytest.raises(RuntimeError) as exc_info:
+                pool.execute_many([
+                    ("INSERT INTO tx_fail VALUES ($1, $2)", ["a", 1]),
+                    ("INSERT INTO tx_fail VALUES ($1, $2)", ["b", None]),
+                    ("INSERT INTO tx_fail VALUES ($1, $2)", ["c", 3]),
+                ])
+
+            assert "not-null" in str(exc_info.value)
+            assert "aborted" not in str(exc_info.value)
+
+            # Nothing was committed, including the first insert
+            row = pool.fetch_one("SELECT count(*)::int AS n FROM tx_fail")
+            assert row["n"] == 0
+        finally:
+            pool.execute_raw("DROP TABLE IF EXISTS tx_fail")
+
+    def test_execute_many_uses_earlier_statements(self, pool):
+        """Test statements can use a table created earlier in the same call."""
+        # The INSERTs can't be prepared before the CREATE has run
+        counts = pool.execute_many([
+            ("CREATE TEMP TABLE tx_created (a int) ON COMMIT DROP", None),
+            ("INSERT INTO tx_created VALUES ($1)", [1]),
+            ("INSERT INTO tx_created VALUES ($1)", [2]),
+            ("SELECT * FROM tx_created", None),
+        ])
+
+        assert counts == [0, 1, 1, 2]
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])